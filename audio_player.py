@@ -3,20 +3,63 @@ import uasyncio as asyncio
 
 from machine import Pin, I2S
 from ulab import numpy as np
-import wave 
 
 
 _DEFAULT_I2S_BUFFER_SIZE_BYTES = 16 * 1024
-_DEFAULT_FILE_BUFFER_SIZE_BYTES = 4 * 1024
+# By default a file buffer is half of the I2S internal buffer, so every `drain()` hands over a payload that fits
+# in the free half of the buffer while the other half is being played (no short writes, fewer awaits per second).
+_DEFAULT_FILE_BUFFER_TO_I2S_BUFFER_RATIO = 2
+
+
+_WAV_HEADER_FORMAT = "<4sI4s4sIHHIIHH4sI"  # RIFF header, `fmt ` chunk and the next chunk's header.
+_WAV_HEADER_SIZE_BYTES = 44
+_CHUNK_HEADER_FORMAT = "<4sI"
+_CHUNK_HEADER_SIZE_BYTES = 8
+
+_HEADER_CACHE = {}  # filename -> (sample_rate, num_channels, bits_per_sample, data_offset)
+
+
+def _parse_header(filename: str):
+    """Returns a tuple of (sample_rate, num_channels, bits_per_sample, data_offset).
+    
+    The file is only parsed on the first call, later calls with the same filename are served from a cache.
+    `data_offset` is where the samples start, which isn't always byte 44 (some files carry extra chunks).
+    """
+    if filename in _HEADER_CACHE:
+        return _HEADER_CACHE[filename]
+
+    hdr = bytearray(_WAV_HEADER_SIZE_BYTES)
+    hdr_mv = memoryview(hdr)
+    with open(filename, "rb") as fh:
+        if fh.readinto(hdr_mv) != _WAV_HEADER_SIZE_BYTES:
+            raise ValueError(f"{filename} is too short to be a WAV file")
+        (riff_id, _, wave_id, fmt_id, fmt_size, _, num_channels, sample_rate, _, _, bits_per_sample, 
+            chunk_id, _) = struct.unpack_from(_WAV_HEADER_FORMAT, hdr)
+        if riff_id != b"RIFF" or wave_id != b"WAVE" or fmt_id != b"fmt ":
+            raise ValueError(f"{filename} is not a WAV file")
+
+        if fmt_size == 16 and chunk_id == b"data":  # The common case, samples start right after the header.
+            data_offset = _WAV_HEADER_SIZE_BYTES
+        else:
+            # Walk the chunks (skipping LIST etc.) until the `data` chunk.
+            data_offset = 20 + fmt_size + (fmt_size & 1)
+            while True:
+                fh.seek(data_offset)
+                if fh.readinto(hdr_mv[:_CHUNK_HEADER_SIZE_BYTES]) != _CHUNK_HEADER_SIZE_BYTES:
+                    raise ValueError(f"{filename} has no data chunk")
+                chunk_id, chunk_size = struct.unpack_from(_CHUNK_HEADER_FORMAT, hdr)
+                data_offset += _CHUNK_HEADER_SIZE_BYTES
+                if chunk_id == b"data":
+                    break
+                data_offset += chunk_size + (chunk_size & 1)  # chunks are word-aligned
+
+    _HEADER_CACHE[filename] = (sample_rate, num_channels, bits_per_sample, data_offset)
+    return _HEADER_CACHE[filename]
 
 
 def _get_wav_file_attributes(filename: str):
     """Returns a tuple of (sample_rate, num_channels, bits_per_sample)."""
-    with wave.open(filename) as wavf:
-        sample_rate = wavf.getframerate()
-        num_channels = wavf.getnchannels()
-        sample_width = wavf.getsampwidth()
-    return sample_rate, num_channels, sample_width * 8
+    return _parse_header(filename)[:3]
 
 
 class AudioMixer:
@@ -25,39 +68,89 @@ class AudioMixer:
             self._buffer = bytearray(file_buffer_size_bytes)
             self.buffer_mv = memoryview(self._buffer)
             self.fh = None
+            self._mem_samples = None  # with `load_mem()`, all of the file's samples instead of `fh`
+            self._mem_cursor = 0  # in samples
+            self._reached_eof = False
+            self.data_offset = 0
             self.bytes_read = 0
-            self.samples = np.frombuffer(self.buffer_mv, dtype=np.int16).reshape((1, file_buffer_size_bytes // 2))  # TBD: assuming 16 bits per sample here!!
+            self._num_samples = file_buffer_size_bytes // 2  # TBD: assuming 16 bits per sample here!!
+            self._buffer_samples = np.frombuffer(self.buffer_mv, dtype=np.int16).reshape((1, self._num_samples))
+            self.samples = self._buffer_samples  # with `load_mem()`, a view over the clip instead
 
         def clear(self):
             self.bytes_read = 0
-            if self.is_active:
+            self.samples = self._buffer_samples
+            self.samples[:] = 0  # so a newly loaded file never exposes the previous one's samples
+            if self.fh is not None:
                 self.fh.close()
                 self.fh = None
+            self._mem_samples = None
+            self._reached_eof = False
 
         def reset(self):
-            if self.is_active:
-                self.fh.seek(44)  # Start of data section in WAV files
+            if self.fh is not None:
+                self.fh.seek(self.data_offset)  # Start of data section in the WAV file
+            self._mem_cursor = 0
+            self._reached_eof = False
 
         def load(self, filename):
             self.clear()
+            self.data_offset = _parse_header(filename)[3]
             self.fh = open(filename, "rb")
             self.reset()
 
+        def load_mem(self, filename):
+            """Like `load()`, but reads the whole file into memory once. 
+            
+            Meant for short clips that are replayed often - reading (and `reset()`) involve no file I/O, and 
+            `samples` is a view over the clip rather than a copy.
+            """
+            self.clear()
+            self.data_offset = _parse_header(filename)[3]
+            with open(filename, "rb") as fh:
+                data = fh.read()
+            self._mem_num_samples = (len(data) - self.data_offset) // 2
+            self._mem_samples = np.frombuffer(data, dtype=np.int16, count=self._mem_num_samples, 
+                offset=self.data_offset).reshape((1, self._mem_num_samples))
+            self.reset()
+
         @property
         def is_active(self):
-            return self.fh is not None
+            return (self.fh is not None or self._mem_samples is not None) and not self._reached_eof
 
         def _read(self):
             if not self.is_active:
                 return
-            self.bytes_read = self.fh.readinto(self.buffer_mv)
+            if self._mem_samples is not None:
+                start = self._mem_cursor
+                end = min(start + self._num_samples, self._mem_num_samples)
+                self.bytes_read = (end - start) * 2
+                self._mem_cursor = end
+                if end - start == self._num_samples:
+                    self.samples = self._mem_samples[:, start:end]  # a view, no copy
+                else:
+                    # The last (short) window is copied, so it can be zero-padded without touching the clip.
+                    self.samples = self._buffer_samples
+                    self.samples[:, :end - start] = self._mem_samples[:, start:end]
+            else:
+                self.bytes_read = self.fh.readinto(self.buffer_mv)
+            if self.bytes_read == 0:  # until `reset()`, the channel is inactive and doesn't hold back the mix
+                self._reached_eof = True
+            if self.bytes_read < len(self.buffer_mv):
+                # Zero-padding a short read, so the channel contributes silence to the rest of the frame.
+                self.samples[0, self.bytes_read // 2:] = 0
 
 
     def __init__(self, sck_gpio: int, ws_gpio: int, sd_gpio: int,
         wav_num_channels = 2, wav_sample_rate = 44100, wav_sample_bits = 16,
         i2s_buffer_size_bytes = _DEFAULT_I2S_BUFFER_SIZE_BYTES,
-        file_buffer_size_bytes = _DEFAULT_FILE_BUFFER_SIZE_BYTES,
+        file_buffer_size_bytes = None,
         num_mixer_channels = 1):
+        """`file_buffer_size_bytes` is the payload of a single I2S write. It defaults to 
+        `i2s_buffer_size_bytes // 2`, so a drain completes right after one half of the I2S buffer is freed.
+        """
+        if file_buffer_size_bytes is None:
+            file_buffer_size_bytes = i2s_buffer_size_bytes // _DEFAULT_FILE_BUFFER_TO_I2S_BUFFER_RATIO
 
         self.sck_gpio = sck_gpio
         self.ws_gpio = ws_gpio
@@ -66,6 +159,14 @@ class AudioMixer:
         self.num_channels = num_mixer_channels
         self.channels = [AudioMixer.Channel(file_buffer_size_bytes) for _ in range(num_mixer_channels)]
 
+        # Preallocated mixing output, so the main loop doesn't allocate per frame.
+        self._mix_buf = bytearray(file_buffer_size_bytes)
+        self._mix_buf_mv = memoryview(self._mix_buf)
+        num_samples = file_buffer_size_bytes // 2  # TBD: assuming 16 bits per sample here!!
+        self._mix_samples = np.frombuffer(self._mix_buf_mv, dtype=np.int16).reshape((1, num_samples))
+        # Only needed when 2+ channels are mixed together (int16 sums would overflow).
+        self._mix_acc = np.zeros((1, num_samples), dtype=np.float) if num_mixer_channels > 1 else None
+
         self.i2s_out = I2S(0, sck=Pin(sck_gpio), ws=Pin(ws_gpio), sd=Pin(sd_gpio), mode=I2S.TX, 
             bits=wav_sample_bits, format=(I2S.STEREO if wav_num_channels==2 else I2S.MONO), rate=wav_sample_rate,
             ibuf=i2s_buffer_size_bytes)
@@ -75,32 +176,37 @@ class AudioMixer:
             raise NotImplementedError("AudioMixer supports ints only as channel IDs")
         return self.channels[item]
 
+    def _read_channels(self):
+        for channel in self.channels:
+            channel._read()
+
     async def start(self):
         swriter = asyncio.StreamWriter(self.i2s_out)
 
         while True:
-            # Read from all channels
-            for channel in self.channels:
-                channel._read()
-
-            # Mix together
-
-            # min_bytes_read = min(channel.bytes_read for channel in self.channels if channel.is_active)
-            # min_num_samples = min_bytes_read // 2  # TBD: assuming 16 bits per sample.
-            # channels_samples = np.concatenate(
-            #     tuple(channel.samples[:, :min_num_samples] for channel in self.channels if channel.is_active),
-            #     axis=0)
-            
-            # print(channels_samples.shape)
-            # print(channels_samples[:, :5])
-            # mixed_samples = np.sum(channels_samples, axis=0)
-            # print(mixed_samples.shape)
-            # print(mixed_samples[:5])
-
-            # mixed_bytes_read = min_bytes_read
-            # mixed_bytes = mixed_samples.tobytes()
-            mixed_bytes = self.channels[0].buffer_mv[:self.channels[0].bytes_read]
-
+            # Reading only after the previous `drain()`, which is where user code runs. This way a `load()` or 
+            # `reset()` done meanwhile is already reflected in this frame.
+            self._read_channels()
+
+            active_channels = [channel for channel in self.channels if channel.is_active]
+            if not active_channels:
+                await asyncio.sleep(0)
+                continue
+
+            # Mix together (in place, into the preallocated mix buffer). Short reads are zero-padded, so the frame
+            # is as long as the longest read.
+            num_samples = max(channel.bytes_read for channel in active_channels) // 2  # TBD: assuming 16 bits per sample.
+            if len(active_channels) == 1:
+                self._mix_samples[:, :num_samples] = active_channels[0].samples[:, :num_samples]
+            else:
+                # Summing in float, then attenuating by 1/N, so the mix always fits back into int16.
+                acc = self._mix_acc[:, :num_samples]
+                acc[:] = active_channels[0].samples[:, :num_samples]
+                for channel in active_channels[1:]:
+                    acc += channel.samples[:, :num_samples]
+                acc *= 1. / len(active_channels)
+                self._mix_samples[:, :num_samples] = acc
+            mixed_bytes = self._mix_buf_mv[:num_samples * 2]
 
             # Write to I2S
             # apply temporary workaround to eliminate heap allocation in uasyncio Stream class.
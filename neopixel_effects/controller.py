@@ -25,41 +25,41 @@ class NeoPixelEffectsController:
     class ControllerDevice:
         def __init__(self, device):
             self.device = device
-            self.active_effects = {}  # effect -> start_time (in time.ticks_us())
+            self.active_effects = []  # (effect, start_time (in time.ticks_us()))
+            self._accum = np.zeros(device.state_shape)  # reused every update to sum all effects
 
         def add_effect(self, effect_spec):
             effect = effect_spec.with_device(self.device)
-            self.active_effects[effect] = time.ticks_us()
+            self.active_effects.append((effect, time.ticks_us()))
             return effect
 
         def update(self, current_ticks_us):
-            s1 = time.ticks_us()
+            self._accum[:] = 0
+            completed_indices = []
 
-            num_effects = len(self.active_effects)
-
-            state_matrix = np.zeros((num_effects,) + self.device.state_shape)        
-
-            for i, (effect, effect_start_time) in enumerate(self.active_effects.items()):
+            for i, (effect, effect_start_time) in enumerate(self.active_effects):
                 if not effect.is_completed:
                     relative_effect_time = time.ticks_diff(current_ticks_us, effect_start_time) / 1e6
                     effect_state_matrix = effect(relative_time_secs=relative_effect_time)
 
                     if effect_state_matrix is not None:  # effect is not finished
-                        state_matrix[i] = effect(relative_time_secs=relative_effect_time)
+                        self._accum += effect_state_matrix
                         continue 
                 
                 # If effect.is_completed or effect returned None
-                del self.active_effects[effect]
-                
+                completed_indices.append(i)
 
-            state_matrix = np.sum(state_matrix, axis=0)  # Sum all effects.
-            state_matrix = np.clip(state_matrix, 0, 255)
+            # Removing outside of the loop, so the list isn't mutated while being iterated.
+            if completed_indices:
+                self.active_effects = [
+                    item for i, item in enumerate(self.active_effects) if i not in completed_indices]
 
-            self.device.update_state(state_matrix)
+            self.device.update_state(self._accum)  # the device clips
 
 
     def __init__(self, devices, updates_freq_hz=50): 
         self.time_per_update_secs = 1. / updates_freq_hz
+        self._time_per_update_us = int(self.time_per_update_secs * 1e6)
         self.devices = {
             device_name: self.ControllerDevice(device) 
             for device_name, device in devices.items()
@@ -68,6 +68,7 @@ class NeoPixelEffectsController:
 
     def start(self):
         async def _start():
+            next_update_ticks_us = time.ticks_us()
             while True:
                 start_ticks_us = time.ticks_us()
 
@@ -75,10 +76,13 @@ class NeoPixelEffectsController:
                 for device_name, controller_device in self.devices.items():
                     controller_device.update(start_ticks_us)
 
-                # sleep for the reminder of the cycle (if needed)
-                cycle_time_secs = time.ticks_diff(time.ticks_us(), start_ticks_us) / 1e6  # duration is now in seconds
-                sleep_time = max(0, self.time_per_update_secs - cycle_time_secs)
-                await asyncio.sleep(sleep_time)
+                # sleep until the next deadline (deadlines are fixed, so timing doesn't drift)
+                next_update_ticks_us = time.ticks_add(next_update_ticks_us, self._time_per_update_us)
+                sleep_time_us = time.ticks_diff(next_update_ticks_us, time.ticks_us())
+                if sleep_time_us < 0:  # running late, re-anchor instead of bursting to catch up
+                    next_update_ticks_us = time.ticks_us()
+                    sleep_time_us = 0
+                await asyncio.sleep_ms(sleep_time_us // 1000)
         
         self._asyncio_task = asyncio.create_task(_start())
 
@@ -15,7 +15,10 @@ class NeoPixelDevice:
     and the controller schedules effects on all of them together.
     """
     def update_state(self, state: np.array): 
-        """Updates the pixels given a `state` (np.array with RGB values per pixel)."""
+        """Updates the pixels given a `state` (np.array with RGB values per pixel).
+        
+        Values may fall outside of 0..255 (the controller sums all effects), devices are expected to clip.
+        """
     
     @property
     def state_shape(self) -> np.array: ...
@@ -32,8 +35,13 @@ class NeoPixelStrip(NeoPixelDevice):
         self.num_pixels = num_pixels
         self.num_channels = num_channels
         self.intensity_factor = intensity_factor
-        self.neopixel = neopixel.NeoPixel(self.gpio_pin, self.num_pixels)
+        self.neopixel = neopixel.NeoPixel(self.gpio_pin, self.num_pixels, bpp=self.num_channels)
         self._state_shape = (self.num_pixels, self.num_channels)
+        # A uint8 view of the driver's own pixel buffer, so a state can be written in one vectorized op.
+        # `neopixel.buf` is written in place (never rebound), which spares a full copy per update.
+        self._buf_mv = memoryview(self.neopixel.buf)
+        self._out_mv = np.frombuffer(self._buf_mv, dtype=np.uint8).reshape(self._state_shape)
+        self._scratch = np.zeros(self._state_shape)  # intensity scaling is done in place here
 
     @property
     def state_shape(self):
@@ -42,6 +50,9 @@ class NeoPixelStrip(NeoPixelDevice):
     def update_state(self, state: np.array):
         self._validate_state_shape(state)
         # Bulk-writing in a more efficient way..
-        state = state * self.intensity_factor
-        self.neopixel.buf = bytes(int(x) for x in state.flatten())
+        self._scratch[:] = state
+        self._scratch *= self.intensity_factor
+        # Clipping the scaled state at 255*intensity is the same as clipping the state at 255 before scaling.
+        max_value = 255 * min(self.intensity_factor, 1.)
+        self._out_mv[:] = np.clip(self._scratch, 0, max_value)  # the uint8 view does the downcast
         self.neopixel.write()
@@ -54,6 +54,18 @@ class Effect:
         self._set_completed()
 
 
+def _supports_out_kwarg():
+    """Whether this ulab build accepts `out=` in its vectorized functions (it varies between ports)."""
+    try:
+        np.exp(np.zeros(1), out=np.zeros(1))
+        return True
+    except (TypeError, NotImplementedError):
+        return False
+
+
+_HAS_OUT = _supports_out_kwarg()
+
+
 _DEFAULT_TOTAL_EFFECT_TIME = 1.0
 _DEFAULT_RGB_COLOR = np.array([255, 255, 255])
 
@@ -78,6 +90,20 @@ class MovingEffect(Effect):
             self.reversed = reversed
             self.indefinite_pingpong = indefinite_pingpong
 
+    def __init__(self, spec, device):
+        super().__init__(spec, device)
+        num_pixels, num_channels = device.state_shape
+        # Cached once per effect so `_calculate_state` can stay vectorized.
+        self._xs = np.arange(num_pixels, dtype=np.float)
+        self._color = np.array(self.spec.rgb_color, dtype=np.float)
+        self._color_row = self._color.reshape((1, num_channels))
+        # Picking the kernel once, so `__call__` doesn't branch on ulab's capabilities every frame.
+        # Subclasses may define `_calculate_state_with_out` (same as `_calculate_state`, but computes into
+        # preallocated buffers), which is used on ulab builds that support `out=`.
+        self._compute_state = self._calculate_state
+        if _HAS_OUT and hasattr(self, "_calculate_state_with_out"):
+            self._compute_state = self._calculate_state_with_out
+
     def _calculate_state(self, current_pos, num_pixels, num_channels): ...
 
     def __call__(self, relative_time_secs):
@@ -96,7 +122,7 @@ class MovingEffect(Effect):
         else:
             current_pos = num_pixels * relative_time_secs / self.spec.total_effect_time
         current_pos = min(current_pos, num_pixels - 1)  # handling an end case of the last pixel
-        current_state = self._calculate_state(current_pos, num_pixels, num_channels)
+        current_state = self._compute_state(current_pos, num_pixels, num_channels)
 
         if self.spec.reversed:
             current_state = current_state[::-1]
@@ -109,10 +135,18 @@ class SinglePixelMovingEffect(MovingEffect):
         def __init__(self, **kwargs):
             super().__init__(SinglePixelMovingEffect, **kwargs)
 
+    def __init__(self, spec, device):
+        super().__init__(spec, device)
+        self._state = np.zeros(device.state_shape)  # only one pixel is ever lit, the rest stay zero
+        self._last_idx = None
+
     def _calculate_state(self, current_pos, num_pixels, num_channels):
-        state = np.zeros((num_pixels, num_channels))
-        state[int(current_pos)] = self.spec.rgb_color
-        return state
+        if self._last_idx is not None:
+            self._state[self._last_idx] = 0
+        idx = int(current_pos)
+        self._state[idx] = self._color
+        self._last_idx = idx
+        return self._state
 
 
 class GaussianMovingEffect(MovingEffect):
@@ -122,15 +156,35 @@ class GaussianMovingEffect(MovingEffect):
             super().__init__(GaussianMovingEffect, **kwargs)
             self.sigma = sigma
 
+    def __init__(self, spec, device):
+        super().__init__(spec, device)
+        if _HAS_OUT:
+            num_pixels = device.state_shape[0]
+            self._xs_col = self._xs.reshape((num_pixels, 1))
+            self._gaussian = np.zeros((num_pixels, 1))
+            self._color_tile = np.ones((num_pixels, 1)) * self._color_row
+            self._state = np.zeros(device.state_shape)
+
     @staticmethod
     def _normed_gaussian(x, mu, sigma):
         return np.exp(-0.5 * ((x - mu) / sigma) ** 2)
 
     def _calculate_state(self, current_pos, num_pixels, num_channels):
-        return np.concatenate(
-            tuple(self.spec.rgb_color.reshape((1, num_channels)) * self._normed_gaussian(i, mu=current_pos, sigma=self.spec.sigma) for i in range(num_pixels)),
-            axis=0
-        )
+        gaussian = self._normed_gaussian(self._xs, mu=current_pos, sigma=self.spec.sigma)
+        return gaussian.reshape((num_pixels, 1)) * self._color_row
+
+    def _calculate_state_with_out(self, current_pos, num_pixels, num_channels):
+        # Same as `_normed_gaussian`, but every step is done in place.
+        gaussian = self._gaussian
+        gaussian[:] = self._xs_col
+        gaussian -= current_pos
+        gaussian *= 1. / self.spec.sigma
+        gaussian *= gaussian
+        gaussian *= -0.5
+        np.exp(gaussian, out=gaussian)
+        self._state[:] = self._color_tile
+        self._state *= gaussian
+        return self._state
 
 
 class DecayMovingEffect(MovingEffect):
@@ -141,11 +195,9 @@ class DecayMovingEffect(MovingEffect):
             self.decay_factor = decay_factor
 
     def _calculate_state(self, current_pos, num_pixels, num_channels):
-        exponent = current_pos - np.arange(num_pixels, dtype=np.float)
-        exponent[exponent < 0] = np.inf
-        return np.concatenate(
-            tuple(self.spec.rgb_color.reshape((1, num_channels)) for _ in range(num_pixels))
-        ) * (self.spec.decay_factor ** exponent).reshape((num_pixels, 1))
+        exponent = np.clip(current_pos - self._xs, 0, 1e9)
+        decay = (self.spec.decay_factor ** exponent) * (self._xs <= current_pos)  # no trail ahead of the pixel
+        return decay.reshape((num_pixels, 1)) * self._color_row
 
 
 class SinusEffect(Effect):
@@ -158,16 +210,31 @@ class SinusEffect(Effect):
             self.freq = freq
             self.cycle_time = cycle_time
     
-    def __call__(self, relative_time_secs):
-        num_pixels, num_channels = self.device.state_shape
+    def __init__(self, spec, device):
+        super().__init__(spec, device)
+        num_pixels, num_channels = device.state_shape
+        # Everything but the sinus phase is constant, so it's computed once and the state buffer is reused.
+        self._base_color = np.ones((num_pixels, 1)) * self.spec.base_color.reshape((1, num_channels))
+        self._additional_color = np.ones((num_pixels, 1)) * self.spec.additional_color.reshape((1, num_channels))
+        # Kept as columns, so they broadcast against the state without a per-frame reshape.
+        self._phases = np.linspace(0, 2 * np.pi * self.spec.freq, num_pixels).reshape((num_pixels, 1))
+        self._sin_values = np.zeros((num_pixels, 1))
+        self._state = np.zeros((num_pixels, num_channels))
 
+    def __call__(self, relative_time_secs):
         rel_cycle = 2 * np.pi * (relative_time_secs / self.spec.cycle_time) % 1.0
-        sin_values = 0.5 + 0.5 * np.sin(np.linspace(rel_cycle, rel_cycle + 2 * np.pi * self.spec.freq, num_pixels))
-        base_color = np.concatenate(
-            tuple(self.spec.base_color.reshape((1, num_channels)) for _ in range(num_pixels))
-        )
-        additional_color = np.concatenate(
-            tuple(self.spec.additional_color.reshape((1, num_channels)) for _ in range(num_pixels))
-        )
-        state = base_color + sin_values.reshape((num_pixels, 1)) * additional_color
-        return state
+
+        # Every step is done in place (`np.sin` still allocates on ulab builds without `out=`).
+        sin_values = self._sin_values
+        sin_values[:] = self._phases
+        sin_values += rel_cycle
+        if _HAS_OUT:
+            np.sin(sin_values, out=sin_values)
+        else:
+            sin_values[:] = np.sin(sin_values)
+        sin_values *= 0.5
+        sin_values += 0.5
+        self._state[:] = self._additional_color
+        self._state *= sin_values
+        self._state += self._base_color
+        return self._state